@@ -3,6 +3,7 @@
 
 click # CLI toolkit
 ftfy # For fixing character encoding issues
+lxml # Tests only: reference Atom feed generation to check the feeds against
 markdown # Markdown to HTML
-python-dateutil # Better date and time utilities
+orjson # Fast JSON parsing
 pytest # Unit testing, such as it is
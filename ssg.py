@@ -1,23 +1,31 @@
 """
 Static site generator. Run with ssg.sh.
+
+Heavier dependencies (Markdown, ftfy) are imported
+where they're used, so that commands which don't need them start quickly.
 """
 
 import click
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import datetime
-import dateutil.tz
-import ftfy
+import errno
+import functools
 import hashlib
 import html
 import itertools
 import json
-import markdown
 import math
+import mmap
+import operator
+import orjson
 import os
 from os import path
+import pickle
 import re
 import sys
 import urllib.parse as urls
-import xml.etree.ElementTree as ET
+import zoneinfo
 
 #### Settings
 
@@ -28,6 +36,10 @@ gen_root = f"{site_root}/blog"
 base_path = "/blog" # Absolute path for most cases
 base_authority = "https://www.brainonfire.net" # for a few links
 
+# Build caches for incremental generation. Kept outside of site_root
+# so that they're never published.
+cache_dir = "/home/timmc/www/bof/ssg-cache"
+
 site_title = "Brain on Fire"
 site_subtitle = "Tim McCormack says words"
 
@@ -78,11 +90,23 @@ def chunk_stable(items, chunk_size, min_size):
             take = chunk_size
         else:
             take = remaining
-        chunks.insert(0, items[remaining - take:remaining])
+        chunks.append(items[remaining - take:remaining])
         remaining -= take
+    # Built from the end of the list backwards
+    chunks.reverse()
     return chunks
 
 
+@functools.lru_cache(maxsize=None)
+def build_format_version():
+    """
+    Fingerprint of the generator itself. Any change to this file (templates,
+    rendering code, settings) invalidates all build caches.
+    """
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
 #### Loading
 
 
@@ -91,11 +115,15 @@ def list_post_dirs():
     Generator yielding all post directories (as paths) that contain
     an index file.
     """
-    for post_dirname in os.listdir(posts_src_dir):
-        post_dir = path.join(posts_src_dir, post_dirname)
-        index_file = path.join(post_dir, "index.md")
-        if path.isfile(index_file):
-            yield post_dir
+    with os.scandir(posts_src_dir) as entries:
+        for entry in entries:
+            # Directory-ness comes for free with the listing, so only
+            # directories need a stat of their index file.
+            if not entry.is_dir():
+                continue
+            index_file = path.join(entry.path, "index.md")
+            if path.isfile(index_file):
+                yield entry.path
 
 
 re_comment_file_name = re.compile(r'^comment_(?P<type>[a-z]+)_(?P<id>[0-9]+)\.md$')
@@ -105,18 +133,31 @@ def list_comments_for_post(post_dir):
     """
     Generator yielding paths to comment files in a post's dir.
     """
-    for fp in os.listdir(post_dir):
-        m = re_comment_file_name.match(fp)
-        if m is None:
-            continue
-        comment_path = path.join(post_dir, fp)
-        yield comment_path
+    with os.scandir(post_dir) as entries:
+        for entry in entries:
+            # Cheap prefix check first; most entries aren't comments.
+            if not entry.name.startswith('comment_'):
+                continue
+            if re_comment_file_name.match(entry.name) is None:
+                continue
+            yield entry.path
+
+
+def list_source_files():
+    """
+    List the paths of all post and comment files.
+    """
+    return [
+        file_path
+        for post_dir in list_post_dirs()
+        for file_path in [path.join(post_dir, 'index.md'), *list_comments_for_post(post_dir)]
+    ]
 
 
 fm_sep = '---'
-# Consume the newline following the separator as well -- it's not part
-# of the content.
-fm_sep_re = re.compile('^' + re.escape(fm_sep) + '\n', re.MULTILINE)
+# The separator is on a line of its own. Consume the newline following
+# it as well -- it's not part of the content.
+fm_sep_line = fm_sep + '\n'
 
 
 def split_front_matter(file_path):
@@ -126,44 +167,100 @@ def split_front_matter(file_path):
     """
     with open(file_path, 'r') as f:
         combo_raw = f.read()
-    m = fm_sep_re.search(combo_raw)
-    if m is None:
-        log("Couldn't find front-matter separator")
-        return None
-    fm_end, content_begin = m.span()
+    return split_front_matter_text(combo_raw, file_path)
+
+
+def split_front_matter_text(combo_raw, file_path):
+    """
+    As ``split_front_matter``, but for file contents that have already
+    been read. (The path is only used in error messages.)
+    """
+    # Plain substring search for the first separator line (which could
+    # in principle be the very first line.)
+    if combo_raw.startswith(fm_sep_line):
+        fm_end = 0
+    else:
+        fm_end = combo_raw.find('\n' + fm_sep_line) + 1
+        if fm_end == 0:
+            log("Couldn't find front-matter separator")
+            return None
+    content_begin = fm_end + len(fm_sep_line)
 
     json_str = combo_raw[:fm_end]
     content = combo_raw[content_begin:]
     try:
-        meta = json.loads(json_str)
+        # orjson is several times faster than the stdlib, but only
+        # pretty-prints with 2-space indents, so it's only used for
+        # reading front matter.
+        meta = orjson.loads(json_str)
     except Exception as e:
         log(f"ERROR: Could not parse front matter in file {file_path}: {e}")
         raise e
     return (meta, content)
 
 
-def compose_with_front_matter(meta, content_raw, file_path):
+def compose_front_matter(meta, content_raw):
     """
-    Given metadata and text content, recompose to file.
+    Given metadata and text content, recompose to a string.
     Pretty-prints JSON in a canonical way.
     """
     # Pretty-print, sort keys, and don't escape Unicode
     json_norm = json.dumps(meta, indent=4, sort_keys=True, ensure_ascii=False)
-    output = json_norm.strip() + '\n' + fm_sep + '\n' + content_raw
+    return json_norm.strip() + '\n' + fm_sep + '\n' + content_raw
+
+
+def compose_with_front_matter(meta, content_raw, file_path):
+    """
+    Given metadata and text content, recompose to file (as
+    ``compose_front_matter``). The file is left untouched if it already
+    has exactly that content, so that e.g. re-running normalize doesn't
+    rewrite every post.
+    """
+    output = compose_front_matter(meta, content_raw)
+    try:
+        # Compare without newline translation, so that e.g. CRLF line
+        # endings still get rewritten.
+        with open(file_path, 'r', newline='') as pif:
+            if pif.read() == output:
+                return
+    except FileNotFoundError:
+        pass
     with open(file_path, 'w') as pif:
         pif.write(output)
 
 
-meta_keys_required = {'url', 'title', 'date'}
-meta_keys_optional = {'author', 'tags', 'draft', 'id', 'updated', 'unlisted', 'format'}
+meta_keys_required = frozenset({'url', 'title', 'date'})
+meta_keys_optional = frozenset({'author', 'tags', 'draft', 'id', 'updated', 'unlisted', 'format'})
+meta_keys_known = meta_keys_required | meta_keys_optional
 re_post_url_format = re.compile(
     r'^/(?P<year>[0-9]{4})/(?P<month>[0-9]{2})/(?P<day>[0-9]{2})/(?P<slug>[a-z0-9_\-]+)/$'
 )
 
 
+def add_date_strings(meta):
+    """
+    Precompute the formatted dates used when rendering a post or comment,
+    storing them in the ``_internal`` key of its metadata:
+
+    - iso_date, iso_updated: ISO 8601 published and last-updated timestamps
+      (the latter falling back to the published date), for feeds
+    - readable_date, readable_updated: Human-readable published and (if
+      present) updated dates
+    """
+    internal = meta.setdefault('_internal', {})
+    internal['iso_date'] = meta['date'].isoformat(sep='T')
+    internal['iso_updated'] = meta.get('updated', meta['date']).isoformat(sep='T')
+    internal['readable_date'] = format_readable_date(meta['date'])
+    if 'updated' in meta:
+        internal['readable_updated'] = format_readable_date(meta['updated'])
+
+
 def load_comments_for_post(post_dir):
     """
     Returns comments from post dir in sorted order (chronologically ascending).
+
+    Each comment's metadata gains an ``_internal`` key with the formatted
+    dates described in ``add_date_strings``.
     """
     comments = []
 
@@ -172,10 +269,13 @@ def load_comments_for_post(post_dir):
 
         update_value(meta, 'date', datetime.datetime.fromisoformat)
         update_value(meta, 'updated', datetime.datetime.fromisoformat)
+        add_date_strings(meta)
 
-        comments.append({'meta': meta, 'raw': content_raw})
+        # Decorated with the sort key
+        comments.append((meta['date'], {'meta': meta, 'raw': content_raw}))
 
-    return sorted(comments, key=lambda c: c['meta']['date'])
+    comments.sort(key=operator.itemgetter(0))
+    return [comment for _date, comment in comments]
 
 
 def load_post(post_dir):
@@ -193,6 +293,15 @@ def load_post(post_dir):
     - source_dir: String path indicating the directory the post was loaded from
     - path_parts: Directory path (segments, as list of strings) from gen_root,
       redundant with meta['url']
+    - src_hash: Hex digest of the post's front matter, content, and comments
+      (plus the generator code), used for incremental builds
+    - full_url: Absolute URL of the post on the public site
+    - is_public: Whether the post is neither a draft nor unlisted
+    - tag_slugs: Sorted list of unique tag slugs
+    - comment_count_text: Number of comments, as shown in listings
+    - iso_day, listing_day: Posting date (without time) in ISO format and
+      as shown in listings
+    - The formatted dates described in ``add_date_strings``
 
     Some essential keys will get updated with default values, so the meta
     dict is not suitable for saving back to file.
@@ -210,7 +319,16 @@ def load_post(post_dir):
         'comments': load_comments_for_post(post_dir),
     }
 
-    unknown_keys = meta.keys() - meta_keys_required - meta_keys_optional
+    # Fingerprint everything the post's pages are derived from, before
+    # any of it gets modified below.
+    src_hash = hashlib.sha256(build_format_version().encode())
+    for item in [post, *post['comments']]:
+        src_hash.update(json.dumps(item['meta'], sort_keys=True, default=str).encode())
+        src_hash.update(b'\0')
+        src_hash.update(item['raw'].encode())
+        src_hash.update(b'\0')
+
+    unknown_keys = meta.keys() - meta_keys_known
     if unknown_keys:
         log(f"WARN: Unexpected front-matter keys in {post_dir}: {unknown_keys}")
 
@@ -246,35 +364,68 @@ def load_post(post_dir):
     meta['_internal'] = {
         'source_dir': post_dir,
         'path_parts': path_parts,
-        'comments_feed_path': comments_feed_path
+        'comments_feed_path': comments_feed_path,
+        'src_hash': src_hash.hexdigest(),
+        'full_url': base_authority + base_path + meta['url'],
+        'is_public': not meta.get('draft') and not meta.get('unlisted'),
+        'comment_count_text': f"{len(post['comments'])} comment{'' if len(post['comments']) == 1 else 's'}",
+        'iso_day': meta['date'].date().isoformat(),
+        'listing_day': meta['date'].date().strftime('%B %d, %Y'),
     }
+    meta['_internal']['tag_slugs'] = tag_slugs_for_post(post)
+    add_date_strings(meta)
 
     return post
 
 
 def is_public(post):
-    return not post['meta'].get('draft') and not post['meta'].get('unlisted')
+    return post['meta']['_internal']['is_public']
 
 
 #### Command: generate
 
 
 main_feed_path = f"{base_path}/posts.atom"
+main_feed_max_entries = 20
+
+atom_ns = "http://www.w3.org/2005/Atom"
+
 
 # The timezone my blog is written in (timestamps should be presented
 # in this time zone)
-tz_ET = dateutil.tz.gettz('US/Eastern')
+tz_ET = zoneinfo.ZoneInfo('US/Eastern')
+
+
+re_template_tag = re.compile(r'\{\{([a-z_]+)\}\}')
+
+# Template tag names (without prefix) to functions of post URL
+base_template_replacements = {
+    'attach_url': lambda post_url: base_path + post_url + 'attach',
+    'post_url': lambda post_url: base_path + post_url,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def template_replacements(tag_prefix, allowed):
+    """
+    Return the replacement functions for the template tags recognized with
+    this prefix and frozenset of allowed (prefixed) names.
+    """
+    # Doing filtering after prefixing means that the actual in-use tag
+    # name will be listed in the function call, improving grep-ability.
+    replacements = {tag_prefix + k: v for k, v in base_template_replacements.items()}
+    return {k: v for k, v in replacements.items() if k in allowed}
 
 
 def replace_template_tags(
-        content_raw, post_meta, /, *,
+        content_raw, post_url, /, *,
         tag_prefix='', allowed=None, postprocess=None
 ):
     """
     Perform template tag substitution on user content.
 
-    `post_meta` is used to look up information about a post, if needed for
-    a template tag.
+    `post_url` is the URL (relative to base_path) of the post the content
+    belongs to, used by the template tags that link to it.
 
     The `allowed` kwarg is required. Only tags in `allowed` will be
     recognized (must include prefix).
@@ -290,20 +441,16 @@ def replace_template_tags(
     the URL structure later, if needed (although that's to be avoided for
     its own reasons.)
     """
-    base_replacements = {
-        'attach_url': lambda post_meta: base_path + post_meta['url'] + 'attach',
-        'post_url': lambda post_meta: base_path + post_meta['url'],
-    }
+    # Most content has no template tags at all.
+    if '{{' not in content_raw:
+        return content_raw
 
-    # Doing filtering after prefixing means that the actual in-use tag
-    # name will be listed in the function call, improving grep-ability.
-    replacements = {tag_prefix + k: v for k, v in base_replacements.items()}
-    replacements = {k: v for k, v in replacements.items() if k in allowed}
+    replacements = template_replacements(tag_prefix, frozenset(allowed))
 
     def process_tag(m):
         fn = replacements.get(m.group(1))
         if fn:
-            out = fn(post_meta)
+            out = fn(post_url)
             if postprocess is not None:
                 out = postprocess(out)
             return out
@@ -315,12 +462,39 @@ def replace_template_tags(
             print(f"Warning: Found unrecognized template tag '{{{{{m.group(1)}}}}}' {prefix_note}")
             return m.group(0)
 
-    return re.sub(r'\{\{([a-z_]+)\}\}', process_tag, content_raw)
+    return re_template_tag.sub(process_tag, content_raw)
+
+
+@functools.lru_cache(maxsize=None)
+def markdown_converter(format_spec):
+    """
+    Return the Markdown converter for a Markdown-based format spec.
+
+    Converters are set up on first use and must be reset between documents.
+    Creating one loads its extensions and builds all of its processors.
+    """
+    import markdown
+    if format_spec == 'comment-html-v1':
+        return markdown.Markdown(output_format='html5')
+    elif format_spec == 'markdown-v1':
+        return markdown.Markdown(
+            extensions=[
+                'fenced_code',  # ``` code fences
+                'sane_lists',  # various list improvements, esp. start="" attr
+            ],
+            output_format='html5',
+        )
+    else:
+        raise ValueError(f"Not a Markdown format_spec: {format_spec}")
 
 
-def content_to_html(content_raw, post_meta, format_spec):
+@functools.lru_cache(maxsize=4096)
+def content_to_html(content_raw, post_url, format_spec):
     """
-    Generate HTML from user content.
+    Generate HTML from user content belonging to the post at `post_url`.
+
+    Memoized, since the same content is rendered for several pages (post
+    page, listings, feeds) in one run.
     """
     if format_spec == 'html-v1':
         # Used in posts imported from WordPress, and others written
@@ -332,7 +506,7 @@ def content_to_html(content_raw, post_meta, format_spec):
         # New posts *could* use this, but better to create a new
         # format spec based on Markdown, if needed.
         return replace_template_tags(
-            content_raw, post_meta,
+            content_raw, post_url,
             tag_prefix='h_', allowed=['h_post_url', 'h_attach_url'],
             postprocess=html.escape,
         )
@@ -342,38 +516,37 @@ def content_to_html(content_raw, post_meta, format_spec):
         #
         # No new comments should use this format, as it performs no
         # filtering and is therefore unsafe on new content.
-        return markdown.markdown(
+        return markdown_converter(format_spec).reset().convert(
             replace_template_tags(
-                content_raw, post_meta,
+                content_raw, post_url,
                 tag_prefix='h_', allowed=['h_attach_url'],
                 postprocess=html.escape,
-            ),
-            output_format='html5',
+            )
         )
     elif format_spec == 'markdown-v1':
         # Used in posts; Markdown with full HTML escape.
-        return markdown.markdown(
+        return markdown_converter(format_spec).reset().convert(
             replace_template_tags(
-                content_raw, post_meta,
+                content_raw, post_url,
                 allowed=['post_url', 'attach_url'],
-            ),
-            extensions=[
-                'fenced_code',  # ``` code fences
-                'sane_lists',  # various list improvements, esp. start="" attr
-            ],
-            output_format='html5',
+            )
         )
     else:
         raise ValueError(f"Unknown format_spec: {format_spec}")
 
 
+# Escaped once here rather than on every page
+safe_html_site_title = html.escape(site_title)
+safe_html_site_subtitle = html.escape(site_subtitle)
+safe_html_main_feed_path = html.escape(main_feed_path)
+
 safe_html_pre_content = f"""
     <div id="header">
       <h1>
-        <a href="/" title="To root of site">{html.escape(site_title)}</a>
+        <a href="/" title="To root of site">{safe_html_site_title}</a>
         &raquo; <a href="/blog/" title="To main page of blog">Blog</a>
-        <a href="{html.escape(main_feed_path)}" title="Subscribe to feed of posts"><img src="/img/feed.svg" alt="feed icon" class="feed-icon"></a>
-        <small class="subtitle">{html.escape(site_subtitle)}</small>
+        <a href="{safe_html_main_feed_path}" title="Subscribe to feed of posts"><img src="/img/feed.svg" alt="feed icon" class="feed-icon"></a>
+        <small class="subtitle">{safe_html_site_subtitle}</small>
       </h1>
     </div>
 
@@ -395,15 +568,19 @@ safe_html_post_content = f"""
 
     <div id="footer">
       <p>
-        {html.escape(site_title)} uses a custom static blog generator.<br />
+        {safe_html_site_title} uses a custom static blog generator.<br />
         Hosted for pennies a day at
         <a href="https://www.nearlyfreespeech.net/">NearlyFreeSpeech.net</a>.<br />
-        Feed: <a href="{html.escape(main_feed_path)}">all entries</a>.
+        Feed: <a href="{safe_html_main_feed_path}">all entries</a>.
       </p>
     </div>
 """
 
 
+# Separates a post's excerpt from the rest of the content
+more_marker = '\n\n<!--more-->\n\n'
+
+
 def generate_post_content_html(post, excerpt=False):
     """
     Generate HTML for a post body or a post excerpt.
@@ -414,18 +591,46 @@ def generate_post_content_html(post, excerpt=False):
     - If ``excerpt=True``, only the portion before the ``<!--more-->``
       marker is formatted and returned. If the marker is missing, ``None``
       is returned instead (indicating no excerpt).
+    - If the post was pre-rendered by ``load_and_render_post``, that output
+      is returned instead.
     """
-    parts = post['raw'].split('\n\n<!--more-->\n\n', maxsplit=1)
+    rendered = post.get('rendered')
+    if rendered is not None:
+        return rendered['excerpt' if excerpt else 'full']
+
+    raw = post['raw']
     if excerpt:
-        if len(parts) < 2:
+        more_at = raw.find(more_marker)
+        if more_at < 0:
             return None
         else:
-            post_content_raw = parts[0]
+            post_content_raw = raw[:more_at]
     else:
-        post_content_raw = '\n\n'.join(parts)
+        post_content_raw = raw.replace(more_marker, '\n\n', 1)
 
     formatter = post['meta'].get('format', 'html-v1')
-    return content_to_html(post_content_raw, post['meta'], formatter)
+    return content_to_html(post_content_raw, post['meta']['url'], formatter)
+
+
+def load_and_render_post(post_dir):
+    """
+    Load a post (as ``load_post``) and pre-render its content.
+
+    The post gains a ``rendered`` key holding the ``full`` and ``excerpt``
+    HTML, as returned by ``generate_post_content_html``, and each comment
+    gains a ``rendered`` key with its HTML. Rendering is the expensive part
+    of generation and independent per post, so this is run across worker
+    processes (and the results are cached across runs).
+    """
+    post = load_post(post_dir)
+    if post is not None:
+        post['rendered'] = {
+            'full': generate_post_content_html(post),
+            'excerpt': generate_post_content_html(post, excerpt=True),
+        }
+        for comment in post['comments']:
+            comment['rendered'] = generate_comment_content_html(comment, post)
+    return post
 
 
 def generate_quicklinks_page(posts_desc, page_title, safe_html_page_desc, content_class):
@@ -437,21 +642,23 @@ def generate_quicklinks_page(posts_desc, page_title, safe_html_page_desc, conten
     - content_class is the classname to use inside the #primary-content div
     """
     # TODO use safe-by-default templating instead of manual calls to html.escape
-    safe_html_listing = ""
+    safe_html_parts = []
     for year, posts_in_year in itertools.groupby(posts_desc, key=lambda p: p['meta']['date'].year):
-        safe_html_listing += f"<h3>{html.escape(str(year))}</h3>\n"
-        safe_html_listing += "<ul>\n"
+        safe_html_parts.append(f"<h3>{year}</h3>\n")
+        safe_html_parts.append("<ul>\n")
         for post in posts_in_year:
             meta = post['meta']
             url = f"{base_path}{meta['url']}"
-            safe_html_listing += f"""<li><a href="{html.escape(url)}">{html.escape(meta['title'])}</a></li>\n"""
-        safe_html_listing += "</ul>\n"
+            safe_html_parts.append(f"""<li><a href="{html.escape(url)}">{html.escape(meta['title'])}</a></li>\n""")
+        safe_html_parts.append("</ul>\n")
+    safe_html_listing = ''.join(safe_html_parts)
+    safe_html_page_title = html.escape(page_title)
 
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
-  <title>{html.escape(page_title)} | Blog | {html.escape(site_title)}</title>
+  <title>{safe_html_page_title} | Blog | {safe_html_site_title}</title>
 
   <link rel="stylesheet" href="/style/cleaner/generic.css" type="text/css" />
   <link rel="stylesheet" href="/style/cleaner/stylemods/posts.css" type="text/css" />
@@ -473,7 +680,7 @@ def generate_quicklinks_page(posts_desc, page_title, safe_html_page_desc, conten
         <!-- TODO search -->
 
         <div class="page-state">
-          <h2>{html.escape(page_title)}</h2>
+          <h2>{safe_html_page_title}</h2>
           <p>{safe_html_page_desc}</p>
         </div>
       </div>
@@ -500,54 +707,55 @@ def generate_multipost_page(
       If there's a newer_url, add a noindex meta tag.
     """
     # TODO use safe-by-default templating instead of manual calls to html.escape
-    safe_html_listing = ""
+    safe_html_parts = []
     for post in posts_desc:
         meta = post['meta']
-        url = f"{base_path}{meta['url']}"
+        safe_html_url = html.escape(f"{base_path}{meta['url']}")
         excerpt_html = generate_post_content_html(post, excerpt=True)
         if excerpt_html is None:
             safe_html_excerpt_more = '<p>(No excerpt available.)</p>'
         else:
-            safe_html_excerpt_more = excerpt_html + f'\n<p><a href="{html.escape(url)}" class="more-link">Read more</a></p>'
-        comment_counter = f"{len(post['comments'])} comment{'' if len(post['comments']) == 1 else 's'}"
-        safe_html_listing += f"""
+            safe_html_excerpt_more = excerpt_html + f'\n<p><a href="{safe_html_url}" class="more-link">Read more</a></p>'
+        safe_html_parts.append(f"""
 <article class="post">
   <header>
-    <h2><a href="{html.escape(url)}">{html.escape(meta['title'])}</a></h2>
+    <h2><a href="{safe_html_url}">{html.escape(meta['title'])}</a></h2>
     <p class="postmetadata">
-      <span class="timestamp">{html.escape(meta['date'].date().strftime('%B %d, %Y'))}</span> |
-      <span class="comment-count">{html.escape(comment_counter)}</span>
+      <span class="timestamp">{html.escape(meta['_internal']['listing_day'])}</span> |
+      <span class="comment-count">{html.escape(meta['_internal']['comment_count_text'])}</span>
     </p>
   </header>
   <div class="excerpt userformat">
     {safe_html_excerpt_more}
   </div>
 </article>
-"""
+""")
 
-    safe_html_listing += '<div class="backforth">'
+    safe_html_parts.append('<div class="backforth">')
     if newer_url is not None:
         safe_html_meta_tags = '<meta name="robots" content="noindex" />'
-        safe_html_listing += f'<a class="later" href="{html.escape(newer_url)}">More recent entries</a>'
+        safe_html_parts.append(f'<a class="later" href="{html.escape(newer_url)}">More recent entries</a>')
     else:
         safe_html_meta_tags = ''
     if older_url is not None:
         if newer_url is not None:
-            safe_html_listing += ' | '
-        safe_html_listing += f'<a class="earlier" href="{html.escape(older_url)}">Older entries</a>'
-    safe_html_listing += '</div>'
+            safe_html_parts.append(' | ')
+        safe_html_parts.append(f'<a class="earlier" href="{html.escape(older_url)}">Older entries</a>')
+    safe_html_parts.append('</div>')
+    safe_html_listing = ''.join(safe_html_parts)
+    safe_html_page_title = html.escape(page_title)
 
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
-  <title>{html.escape(page_title)} | Blog | {html.escape(site_title)}</title>
+  <title>{safe_html_page_title} | Blog | {safe_html_site_title}</title>
   {safe_html_meta_tags}
 
   <link rel="stylesheet" href="/style/cleaner/generic.css" type="text/css" />
   <link rel="stylesheet" href="/style/cleaner/stylemods/posts.css" type="text/css" />
 
-  <link rel="alternate" type="application/atom+xml" href="{html.escape(main_feed_path)}" />
+  <link rel="alternate" type="application/atom+xml" href="{safe_html_main_feed_path}" />
 </head>
 <body>
   <div id="page">
@@ -565,7 +773,7 @@ def generate_multipost_page(
         <!-- TODO search -->
 
         <div class="page-state">
-          <h2>{html.escape(page_title)}</h2>
+          <h2>{safe_html_page_title}</h2>
           <p>{safe_html_page_desc}</p>
         </div>
       </div>
@@ -577,7 +785,7 @@ def generate_multipost_page(
 </html>
 """
 
-def ordinal_suffix(i):
+def compute_ordinal_suffix(i):
     ones = abs(i) % 10
     tens = abs(i) % 100 // 10
 
@@ -593,17 +801,35 @@ def ordinal_suffix(i):
         return "th"
 
 
+# The suffix only depends on the last two digits, so just look it up.
+ordinal_suffixes = tuple(compute_ordinal_suffix(i) for i in range(100))
+
+
+def ordinal_suffix(i):
+    return ordinal_suffixes[abs(i) % 100]
+
+
+# Safe to memoize by datetime: Aware datetimes for the same instant
+# compare equal even if their offsets differ, but the output only
+# depends on the instant.
+@functools.lru_cache(maxsize=8192)
 def format_readable_date(date):
     local_date = date.astimezone(tz_ET)
+    return f"{format_readable_day(local_date.date())} at {local_date.strftime('%H:%M (%Z)')}"
+
+
+# Many timestamps (comment threads, posts and their updates) fall on
+# the same day, so the day part is cached on its own.
+@functools.lru_cache(maxsize=4096)
+def format_readable_day(day):
     # Python date formatting doesn't have ordinal suffixes and I
     # didn't see a way to skip zero-padding for day and year.
-    return "{}, {} {}{}, {} at {}".format(
-        local_date.strftime('%A'),
-        local_date.strftime('%B'),
-        local_date.day,
-        ordinal_suffix(local_date.day),
-        local_date.year,
-        local_date.strftime('%H:%M (%Z)')
+    return "{}, {} {}{}, {}".format(
+        day.strftime('%A'),
+        day.strftime('%B'),
+        day.day,
+        ordinal_suffix(day.day),
+        day.year,
     )
 
 
@@ -611,33 +837,45 @@ def calc_years_old(date):
     return (datetime.datetime.now(tz_ET) - date).days / 365.25
 
 
+# Tags and comment author names recur across many pages in a run, so
+# their escaped forms are memoized.
+html_escape_recurring = functools.lru_cache(maxsize=8192)(html.escape)
+
+
+re_tag_unsafe_char = re.compile(r'[^a-z0-9]')
+re_tag_dash_run = re.compile(r'\-+')
+
+
+@functools.lru_cache(maxsize=1024)
 def tag_to_slug(tag):
     """Given a tag, normalize to a URL-safe tag slug."""
-    safe = re.sub(r'[^a-z0-9]', '-', tag.lower())
-    short = re.sub(r'\-+', '-', safe)
+    safe = re_tag_unsafe_char.sub('-', tag.lower())
+    short = re_tag_dash_run.sub('-', safe)
     trimmed = short.strip('-')
     return trimmed or '-'
 
 
 def tag_slugs_for_post(post):
     """Get tag slugs for one post object."""
-    slugs = [tag_to_slug(tag) for tag in post['meta'].get('tags', [])]
+    slug_counts = collections.Counter(tag_to_slug(tag) for tag in post['meta'].get('tags', []))
 
-    duplicates = slugs[:]
-    for s in set(slugs):
-        duplicates.remove(s)
+    duplicates = [s for s, count in slug_counts.items() if count > 1]
     if duplicates:
         print(f"WARN: Duplicate tag slugs in {path.basename(post['meta']['_internal']['source_dir'])}: {duplicates}")
 
-    return sorted(list(set(slugs)))
+    return sorted(slug_counts)
 
 
 def generate_comment_content_html(comment, post):
     """
-    Generate HTML for a comment body.
+    Generate HTML for a comment body, or return the HTML pre-rendered by
+    ``load_and_render_post``.
     """
+    rendered = comment.get('rendered')
+    if rendered is not None:
+        return rendered
     formatter = comment['meta'].get('format', 'comment-html-v1')
-    return content_to_html(comment['raw'], post['meta'], formatter)
+    return content_to_html(comment['raw'], post['meta']['url'], formatter)
 
 
 re_comment_safe_author_url = re.compile(r'^https?://', re.IGNORECASE)
@@ -664,32 +902,33 @@ please indicate whether you're OK with having your response posted publicly
         return f"""<p>No comments yet. {safe_html_feed_link}</p> <p>{safe_html_no_commenting}</p>"""
 
     comment_count = str(len(comments))
-    output = f"""
+    output_parts = [f"""
 <h2>Responses: {html.escape(comment_count)} so far {safe_html_feed_link}</h2>
 <ol class="commentlist">
-"""
+"""]
     for comment in comments:
         meta = comment['meta']
-        id_str = str(meta['id'])
-        readable_date = format_readable_date(meta['date'])
+        safe_html_id = html.escape(str(meta['id']))
+        readable_date = meta['_internal']['readable_date']
 
         unchecked_url = meta['authorUrl']
         good_url = None
         if unchecked_url and re_comment_safe_author_url.match(unchecked_url):
             good_url = unchecked_url
+        safe_html_author = html_escape_recurring(meta['author'])
         if good_url:
             safe_html_authorlink = f"""
-<a href="{html.escape(meta['authorUrl'])}" rel="external nofollow" class="url">{html.escape(meta['author'])}</a>"""
+<a href="{html.escape(good_url)}" rel="external nofollow" class="url">{safe_html_author}</a>"""
         else:
-            safe_html_authorlink = html.escape(meta['author'])
+            safe_html_authorlink = safe_html_author
 
         safe_html_comment_content = generate_comment_content_html(comment, post)
 
         # TODO: Add openid indicator when openID=True
-        output += f"""
-<li class="comment" id="comment-{html.escape(id_str)}">
+        output_parts.append(f"""
+<li class="comment" id="comment-{safe_html_id}">
   <small class="commentmetadata">
-    <a href="#comment-{html.escape(id_str)}" title="Permanent link to comment" rel="bookmark">#{html.escape(id_str)}</a>
+    <a href="#comment-{safe_html_id}" title="Permanent link to comment" rel="bookmark">#{safe_html_id}</a>
     |
     {html.escape(readable_date)}
   </small>
@@ -697,12 +936,20 @@ please indicate whether you're OK with having your response posted publicly
   <p class="commentattribution"><cite>{safe_html_authorlink}</cite> says:</p>
   <div class="commentdata userformat">{safe_html_comment_content}</div>
 </li>
-"""
-    output += f"""</ol><p>{safe_html_no_commenting}</p>"""
-    return output
+""")
+    output_parts.append(f"""</ol><p>{safe_html_no_commenting}</p>""")
+    return ''.join(output_parts)
+
 
+# Posts from this date on get the newer avatar
+avatar_2012_since = datetime.datetime.fromisoformat('2012-03-25T00:00:00+00:00')
 
-def generate_post_page(post, tag_slugs_to_posts_desc):
+
+def generate_post_page(post, tag_slug_counts):
+    """
+    Generate a post's page. tag_slug_counts maps tag slugs to the number
+    of public posts with that tag (to decide which tags get linked).
+    """
     meta = post['meta']
 
     permalink = f"{base_path}{meta['url']}"
@@ -724,9 +971,9 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
         # Public posts allow referrer on their outbound calls (if HTTPS)
         referrer_policy = 'no-referrer-when-downgrade'
 
-    readable_posted_date = format_readable_date(meta['date'])
+    readable_posted_date = meta['_internal']['readable_date']
     if 'updated' in meta:
-        readable_updated_date = format_readable_date(meta['updated'])
+        readable_updated_date = meta['_internal']['readable_updated']
         safe_html_updated_date_item = f"""\n            <li>Last updated on {html.escape(readable_updated_date)}</li>"""
     else:
         safe_html_updated_date_item = ""
@@ -734,12 +981,12 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
 
     def tag_to_link(tag):
         slug = tag_to_slug(tag)
-        if len(tag_slugs_to_posts_desc.get(slug, [])) <= 1:
-            return html.escape(tag)
+        if tag_slug_counts.get(slug, 0) <= 1:
+            return html_escape_recurring(tag)
         else:
             url = f"/blog/tag/{slug}/"
             title = f'Posts tagged "{tag}"'
-            return f"""<a href="{html.escape(url)}" title="{html.escape(title)}">{html.escape(tag)}</a>"""
+            return f"""<a href="{html_escape_recurring(url)}" title="{html_escape_recurring(title)}">{html_escape_recurring(tag)}</a>"""
 
     tags = meta.get('tags')
     if tags:
@@ -768,7 +1015,7 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
 """
 
     # Pick an avatar based on date. Should be a nice touch.
-    if 'date' not in meta or meta['date'] >= datetime.datetime.fromisoformat('2012-03-25T00:00:00+00:00'):
+    if 'date' not in meta or meta['date'] >= avatar_2012_since:
         # Avatar commission by Scott Meyer of Basic Instructions, 2012
         avatar_url = '/img/avatar/timmc-2012-basic-left-75.png'
     else:
@@ -777,17 +1024,19 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
 
 
     safe_html_comments = generate_comment_section(post)
+    safe_html_title = html.escape(title)
+    safe_html_permalink = html.escape(permalink)
 
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
-  <title>{html.escape(title)} | {html.escape(site_title)}</title>
+  <title>{safe_html_title} | {safe_html_site_title}</title>
 
   <link rel="stylesheet" href="/style/cleaner/generic.css" type="text/css" />
   <link rel="stylesheet" href="/style/cleaner/stylemods/single.css" type="text/css" />
 
-  <link rel="canonical" href="{html.escape(permalink)}" />
+  <link rel="canonical" href="{safe_html_permalink}" />
   <meta name="referrer" content="{html.escape(referrer_policy)}" />
 </head>
 <body>
@@ -798,7 +1047,7 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
       <div id="primary-content">
         <div class="post">
           <h2 class="post-title">
-            <a href="{html.escape(permalink)}" rel="bookmark" title="Permanent link for post">{html.escape(title)}</a>
+            <a href="{safe_html_permalink}" rel="bookmark" title="Permanent link for post">{safe_html_title}</a>
           </h2>
           {safe_html_topnotes}
           <div class="entrytext userformat">
@@ -841,91 +1090,315 @@ def generate_post_page(post, tag_slugs_to_posts_desc):
 """
 
 
+def post_page_cache_key(post, tag_slug_counts):
+    """
+    Key identifying all inputs to ``generate_post_page`` for this post, so
+    that unchanged pages can be skipped on incremental builds.
+
+    Besides the post's own source, the page depends on which of its tags
+    get linked (tag counts across the whole blog) and on how many years
+    old it is (for the content-age note).
+    """
+    meta = post['meta']
+    tag_links = [
+        tag_slug_counts.get(tag_to_slug(tag), 0) > 1
+        for tag in meta.get('tags', [])
+    ]
+    years_old = math.floor(calc_years_old(meta['date']))
+    key_data = json.dumps([meta['_internal']['src_hash'], tag_links, years_old])
+    return hashlib.sha256(key_data.encode()).hexdigest()
+
+
+def render_post_outputs(post, tag_slug_counts, want_page, want_feed):
+    """
+    Render a post's page and comments feed in a worker process. Either
+    one can be skipped (returned as None) if it's already up to date.
+    """
+    return (
+        generate_post_page(post, tag_slug_counts) if want_page else None,
+        generate_post_comments_atom_feed(post) if want_feed else None,
+    )
+
+
+def posts_feed_cache_key(posts_desc):
+    """
+    Key identifying all inputs to ``generate_posts_atom_feed``, so that an
+    unchanged feed can be skipped on incremental builds.
+    """
+    key_hash = hashlib.sha256(build_format_version().encode())
+    for post in posts_desc[:main_feed_max_entries]:
+        key_hash.update(post['meta']['_internal']['src_hash'].encode())
+    return key_hash.hexdigest()
+
+
+def listing_cache_key(posts_desc, *page_args):
+    """
+    Key identifying all inputs to a listing page (index, archive, tag, or
+    drafts page): the listed posts, plus whatever page-specific arguments
+    are passed in, so that unchanged listings can be skipped on
+    incremental builds.
+    """
+    key_hash = hashlib.sha256(build_format_version().encode())
+    key_hash.update(json.dumps(page_args).encode())
+    for post in posts_desc:
+        key_hash.update(post['meta']['_internal']['src_hash'].encode())
+        # The source hash doesn't cover where a post is published -- a
+        # draft's URL comes from its directory name.
+        key_hash.update(post['meta']['url'].encode())
+        key_hash.update(b'\0')
+    return key_hash.hexdigest()
+
+
+# Characters that can't appear in an XML document at all
+re_xml_invalid_char = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def xml_escape_text(text):
+    """Escape a string for XML character data (as lxml serializes it)."""
+    if re_xml_invalid_char.search(text):
+        raise ValueError(f"String is not XML-compatible: {text!r}")
+    return html.escape(text, quote=False).replace('\r', '&#13;')
+
+
+def xml_escape_attr(value):
+    """Escape a string for a double-quoted XML attribute (as lxml serializes it)."""
+    return (
+        xml_escape_text(value)
+        .replace('"', '&quot;').replace('\n', '&#10;').replace('\t', '&#9;')
+    )
+
+
 def generate_posts_atom_feed(posts_desc):
     """
-    Given posts in descending chronological order, generate an Atom XML feed.
+    Given posts in descending chronological order, generate an Atom XML feed
+    (as UTF-8 bytes).
 
-    This feed is assumed to be the main feed.
+    This feed is assumed to be the main feed. Like the comments feeds, it's
+    written out directly; the tests check that the output is byte-for-byte
+    what lxml would produce from the equivalent element tree.
     """
     # Generate full public-site URL here -- it's a global identifier
     # in some places in the feed, and needs to be absolute in others.
     blog_url = base_authority + base_path
     feed_full_url = base_authority + main_feed_path
 
-    root = ET.Element('feed', {
-        'xmlns': "http://www.w3.org/2005/Atom",
-        'xml:lang': 'en-US',
-        'xml:base': blog_url + '/'
-    })
-    ET.SubElement(root, 'title').text = site_title
-    ET.SubElement(root, 'subtitle').text = site_subtitle
-    ET.SubElement(root, 'link', rel='alternate', type='text/html', href=blog_url)
-    ET.SubElement(root, 'id').text = feed_full_url
-    ET.SubElement(root, 'link', rel='self', type="application/atom+xml", href=feed_full_url)
-    for post in posts_desc[:20]:
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n",
+        f'<feed xmlns="{atom_ns}" xml:lang="en-US" xml:base="{xml_escape_attr(blog_url + "/")}">',
+        f'<title>{xml_escape_text(site_title)}</title>',
+        f'<subtitle>{xml_escape_text(site_subtitle)}</subtitle>',
+        f'<link rel="alternate" type="text/html" href="{xml_escape_attr(blog_url)}"/>',
+        f'<id>{xml_escape_text(feed_full_url)}</id>',
+        f'<link rel="self" type="application/atom+xml" href="{xml_escape_attr(feed_full_url)}"/>',
+    ]
+    for post in posts_desc[:main_feed_max_entries]:
         meta = post['meta']
         # Absolute URL, not absolute path
-        permalink = f"{base_authority}{base_path}{meta['url']}"
-        entry = ET.SubElement(root, 'entry')
-        author = ET.SubElement(entry, 'author')
-        ET.SubElement(author, 'name').text = "Tim McCormack"
-        ET.SubElement(author, 'uri').text = "https://www.brainonfire.net/"
-        ET.SubElement(entry, 'title').text = meta['title']
-        ET.SubElement(entry, 'link', rel='alternate', type='text/html', href=permalink)
-        ET.SubElement(entry, 'id').text = permalink
-        ET.SubElement(entry, 'updated').text = meta.get('updated', meta['date']).isoformat(sep='T')
-        ET.SubElement(entry, 'published').text = meta['date'].isoformat(sep='T')
+        permalink = meta['_internal']['full_url']
+        attr_permalink = xml_escape_attr(permalink)
+        parts.append(
+            '<entry><author><name>Tim McCormack</name><uri>https://www.brainonfire.net/</uri></author>'
+            f"<title>{xml_escape_text(meta['title'])}</title>"
+            f'<link rel="alternate" type="text/html" href="{attr_permalink}"/>'
+            f'<id>{xml_escape_text(permalink)}</id>'
+            f"<updated>{meta['_internal']['iso_updated']}</updated>"
+            f"<published>{meta['_internal']['iso_date']}</published>"
+        )
         for tag in meta.get('tags', []):
-            ET.SubElement(entry, 'category', term=tag)
-        ET.SubElement(entry, 'content', {'xml:base': permalink}, type='html').text = generate_post_content_html(post)
+            parts.append(f'<category term="{xml_escape_attr(tag)}"/>')
+        parts.append(
+            f'<content type="html" xml:base="{attr_permalink}">'
+            f'{xml_escape_text(generate_post_content_html(post))}</content></entry>'
+        )
         # TODO: Comment link, feed, and count
 			  # <link rel="replies" type="text/html" href="https://www.brainonfire.net/blog/2020/07/13/letter-to-ma-governor-covid-19/#comments" thr:count="0"/>
 		    # <link rel="replies" type="application/atom+xml" href="https://www.brainonfire.net/blog/2020/07/13/letter-to-ma-governor-covid-19/feed/atom/" thr:count="0"/>
 		    # <thr:total>0</thr:total>
-    # xml_declaration=True not present until Python 3.8
-    return "<?xml version='1.0' encoding='UTF-8'?>\n" + ET.tostring(root, encoding="unicode")
+    parts.append('</feed>')
+    return ''.join(parts).encode()
 
 
 def generate_post_comments_atom_feed(post):
     """
-    Given a post, generate an Atom feed of its comments.
+    Given a post, generate an Atom feed of its comments (as UTF-8 bytes).
+
+    The feed's structure is small and fixed, so it's written out directly
+    rather than built as a tree; the tests check that the output is
+    byte-for-byte what lxml would produce from the equivalent element tree.
     """
-    # Generate full public-site URL here -- it's a global identifier
-    # in some places in the feed, and needs to be absolute in others.
-    post_full_url = base_authority + base_path + post['meta']['url']
+    post_full_url = post['meta']['_internal']['full_url']
     feed_full_url = base_authority + post['meta']['_internal']['comments_feed_path']
-
-    root = ET.Element('feed', {
-        'xmlns': "http://www.w3.org/2005/Atom",
-        'xml:lang': 'en-US',
-        'xml:base': post_full_url
-    })
-    ET.SubElement(root, 'title').text = f"Comments on “{post['meta']['title']}”"
-    ET.SubElement(root, 'link', rel='alternate', type='text/html', href=f"{post_full_url}#comments")
-    ET.SubElement(root, 'id').text = feed_full_url
-    ET.SubElement(root, 'link', rel='self', type="application/atom+xml", href=feed_full_url)
+    feed_title = f"Comments on “{post['meta']['title']}”"
+    attr_post_full_url = xml_escape_attr(post_full_url)
+    attr_feed_full_url = xml_escape_attr(feed_full_url)
+
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n",
+        f'<feed xmlns="{atom_ns}" xml:lang="en-US" xml:base="{attr_post_full_url}">',
+        f"<title>{xml_escape_text(feed_title)}</title>",
+        f'<link rel="alternate" type="text/html" href="{xml_escape_attr(post_full_url + "#comments")}"/>',
+        f'<id>{xml_escape_text(feed_full_url)}</id>',
+        f'<link rel="self" type="application/atom+xml" href="{attr_feed_full_url}"/>',
+    ]
     for comment in reversed(post['comments']):
         meta = comment['meta']
         # Absolute URL, not absolute path
-        permalink = f"{base_authority}{base_path}{post['meta']['url']}#comment-{meta['id']}"
-        entry = ET.SubElement(root, 'entry')
-        ET.SubElement(entry, 'title').text = f"By: {meta['author']}"
-        ET.SubElement(entry, 'link', rel='alternate', type='text/html', href=permalink)
-        author = ET.SubElement(entry, 'author')
-        ET.SubElement(author, 'name').text = meta['author']
+        permalink = f"{post_full_url}#comment-{meta['id']}"
+        text_author = xml_escape_text(meta['author'])
+        parts.append(
+            f'<entry><title>By: {text_author}</title>'
+            f'<link rel="alternate" type="text/html" href="{xml_escape_attr(permalink)}"/>'
+            f'<author><name>{text_author}</name>'
+        )
         author_url = meta['authorUrl']
         if author_url and re_comment_safe_author_url.match(author_url):
-            ET.SubElement(author, 'uri').text = author_url
-        ET.SubElement(entry, 'id').text = permalink
-        ET.SubElement(entry, 'updated').text = meta.get('updated', meta['date']).isoformat(sep='T')
-        ET.SubElement(entry, 'published').text = meta['date'].isoformat(sep='T')
+            parts.append(f'<uri>{xml_escape_text(author_url)}</uri>')
         safe_html_comment_content = generate_comment_content_html(comment, post)
-        ET.SubElement(entry, 'content', {'xml:base': post_full_url}, type='html').text = safe_html_comment_content
-    return "<?xml version='1.0' encoding='UTF-8'?>\n" + ET.tostring(root, encoding="unicode")
+        parts.append(
+            f'</author><id>{xml_escape_text(permalink)}</id>'
+            f"<updated>{meta['_internal']['iso_updated']}</updated>"
+            f"<published>{meta['_internal']['iso_date']}</published>"
+            f'<content type="html" xml:base="{attr_post_full_url}">{xml_escape_text(safe_html_comment_content)}</content>'
+            '</entry>'
+        )
+    parts.append('</feed>')
+    return ''.join(parts).encode()
+
+
+# Below this many jobs, starting worker processes costs more than it saves.
+min_jobs_for_process_pool = 20
+
+
+def map_across_cores(fn, jobs, *other_iterables):
+    """
+    Return a list of fn applied to each job (and the corresponding items
+    of any other iterables), in a process pool unless there are only a
+    few jobs, as in a typical incremental run.
+    """
+    if len(jobs) < min_jobs_for_process_pool:
+        return list(map(fn, jobs, *other_iterables))
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(fn, jobs, *other_iterables, chunksize=8))
+
+
+def hardlink_attachment(src_path, src_ino, dest_path):
+    """
+    Hardlink an attachment into the output, replacing whatever is at the
+    destination unless it's already that same hardlink.
+    """
+    try:
+        dest_ino = os.stat(dest_path).st_ino
+    except FileNotFoundError:
+        dest_ino = None
+    if dest_ino == src_ino:
+        return
+    if dest_ino is not None:
+        os.remove(dest_path)
+    os.link(src_path, dest_path)
+
+
+def file_has_contents(file_path, expected):
+    """
+    Check whether a file (already known to be the same size) contains
+    exactly the expected bytes. The file is mapped rather than read, so
+    it's compared in place without being copied into memory.
+    """
+    if not expected:
+        return True
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return view == expected
+
+
+def post_dir_signature(post_dir):
+    """
+    Name, mtime, and size of each file directly in a post dir (the post
+    and its comments), to tell whether the post needs loading again.
+    """
+    sig = []
+    with os.scandir(post_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                st = entry.stat()
+                sig.append((entry.name, st.st_mtime_ns, st.st_size))
+    sig.sort()
+    return sig
+
+
+def load_loaded_posts_cache():
+    """
+    Load the posts as loaded and rendered on the last run, as a dict of
+    post dir to (signature, post). Empty if missing or from a different
+    version of the generator.
+    """
+    try:
+        with open(path.join(cache_dir, 'loaded-posts.pickle'), 'rb') as f:
+            cache = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return {}
+    if cache.get('version') != build_format_version():
+        return {}
+    return cache['posts']
+
+
+def save_loaded_posts_cache(posts_by_dir):
+    """Save loaded posts (dict of post dir to (signature, post)) for the next run."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path.join(cache_dir, 'loaded-posts.pickle'), 'wb') as f:
+        pickle.dump({'version': build_format_version(), 'posts': posts_by_dir}, f, pickle.HIGHEST_PROTOCOL)
+
+
+def input_fingerprint():
+    """
+    Fingerprint of everything generation reads: the generator itself,
+    and the path, size, and mtime of every file under posts_src_dir
+    (posts, comments, attachments, config). Today's date is included too,
+    since post pages note how old the post is.
+    """
+    fp = hashlib.sha256(build_format_version().encode())
+    fp.update(datetime.date.today().isoformat().encode())
+    for parent, dirnames, filenames in os.walk(posts_src_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = path.join(parent, filename)
+            st = os.stat(file_path)
+            fp.update(f"{file_path}\0{st.st_mtime_ns}\0{st.st_size}\0".encode())
+    return fp.hexdigest()
+
+
+def load_build_cache():
+    """
+    Load the incremental build cache, or return an empty one if there
+    isn't a usable one.
+    """
+    try:
+        with open(path.join(cache_dir, 'build-cache.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def discard_build_cache():
+    """
+    Remove the saved build cache, if any, so that it's only ever
+    trusted if the run that saved it completed.
+    """
+    try:
+        os.remove(path.join(cache_dir, 'build-cache.json'))
+    except FileNotFoundError:
+        pass
+
+
+def save_build_cache(cache):
+    """Save the incremental build cache for the next run."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path.join(cache_dir, 'build-cache.json'), 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
 
 
 @cli.command(name='generate')
-def cmd_generate():
+@click.option('--full', is_flag=True, help="Ignore the build cache and regenerate every page.")
+def cmd_generate(full):
     """Generate the site."""
 
     with open(path.join(posts_src_dir, 'config.json'), 'r') as cf:
@@ -942,15 +1415,44 @@ def cmd_generate():
     if extra_config_keys := set(ssg_config.keys()) - req_config_keys:
         print(f"WARNING: Unrecognized configuration keys in config.json: {extra_config_keys!r}")
 
-    # Load all posts into memory
+    # If no input has changed at all since the last run, neither has
+    # the output. (Pages and feeds are also cached individually, below.)
+    old_build_cache = {} if full else load_build_cache()
+    fingerprint = input_fingerprint()
+    if fingerprint == old_build_cache.get('input_fingerprint') and path.isdir(gen_root):
+        log("INFO: No inputs have changed since the last run; nothing to do")
+        return
+    # Outputs may change from here on, and the old cache would no longer
+    # describe them if this run doesn't get as far as saving a new one.
+    discard_build_cache()
+
+    # Load all posts into memory. Posts whose files haven't changed
+    # since the last run are reused as loaded (and rendered) then; the
+    # rest are loaded and rendered across all cores.
+    post_dirs = list(list_post_dirs())
+    old_loaded_posts = {} if full else load_loaded_posts_cache()
+    post_dir_sigs = {post_dir: post_dir_signature(post_dir) for post_dir in post_dirs}
+    dirs_to_load = [
+        post_dir for post_dir in post_dirs
+        if old_loaded_posts.get(post_dir, (None, None))[0] != post_dir_sigs[post_dir]
+    ]
+    freshly_loaded = dict(zip(dirs_to_load, map_across_cores(load_and_render_post, dirs_to_load)))
     posts = []
-    for post_dir in list_post_dirs():
-        post = load_post(post_dir)
+    for post_dir in post_dirs:
+        if post_dir in freshly_loaded:
+            post = freshly_loaded[post_dir]
+        else:
+            post = old_loaded_posts[post_dir][1]
         if post is None:
             # Don't proceed to deleting all generated pages -- maybe
             # the parser is wrong, not this one file.
             raise Exception(f"ERROR: Could not process post in directory {post_dir}")
         posts.append(post)
+    save_loaded_posts_cache({
+        post_dir: (post_dir_sigs[post_dir], post)
+        for post_dir, post in zip(post_dirs, posts)
+    })
+    del old_loaded_posts, freshly_loaded
     posts_desc = sorted(posts, key=lambda p: p['meta']['date'], reverse=True)
     del posts
 
@@ -960,7 +1462,7 @@ def cmd_generate():
     for post in posts_desc:
         if not is_public(post):
             continue  # don't leak tags/counts from non-public posts
-        for slug in tag_slugs_for_post(post):
+        for slug in post['meta']['_internal']['tag_slugs']:
             tag_slugs_to_posts_desc.setdefault(slug, []).append(post)
 
     # If we simply wipe out the generated directory and regenerate
@@ -973,11 +1475,19 @@ def cmd_generate():
     # but wouldn't have been generated. The below is the pair of sets
     # used to track this.
 
-    # Collect all existing non-directory paths.
+    # Collect all existing non-directory paths (and, while at it, the
+    # directories.) Symlinks to directories show up as dirnames, but
+    # aren't descended into, so they count as plain paths.
     existing_paths = set()
-    for parent, _dirnames, filenames in os.walk(gen_root):
+    existing_dirs = set()
+    for parent, dirnames, filenames in os.walk(gen_root):
+        existing_dirs.add(parent)
         for filename in filenames:
             existing_paths.add(path.join(parent, filename))
+        for dirname in dirnames:
+            dir_path = path.join(parent, dirname)
+            if path.islink(dir_path):
+                existing_paths.add(dir_path)
     # Mutable: All files
     paths_written = set()
 
@@ -991,19 +1501,33 @@ def cmd_generate():
     def write_and_record(abs_path, content):
         """
         Write to the path if the contents differ, and note as written.
-        """
-        newbytes = content.encode()
-
-        if path.exists(abs_path):
-            with open(abs_path, 'rb') as f:
-                oldbytes = f.read()
-        else:
-            oldbytes = None
 
-        if newbytes != oldbytes:
-            with open(abs_path, 'wb') as f:
-                f.write(newbytes)
-            if oldbytes is None:
+        Content may be a string or already-encoded bytes.
+        """
+        newbytes = content if isinstance(content, bytes) else content.encode()
+
+        try:
+            old_size = os.stat(abs_path).st_size
+        except FileNotFoundError:
+            old_size = None
+
+        if old_size != len(newbytes) or not file_has_contents(abs_path, newbytes):
+            # Write alongside and swap into place, so an interrupted run
+            # never leaves a half-written file to be published. The temp
+            # file is removed again if the write fails, since a later run
+            # may exit early without cleaning up stale files.
+            tmp_path = abs_path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(newbytes)
+                os.replace(tmp_path, abs_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            if old_size is None:
                 print(f"Creating {abs_path}")
             else:
                 print(f"Updating {abs_path}")
@@ -1011,57 +1535,147 @@ def cmd_generate():
         record_written_file(abs_path)
 
 
-    # Generate post pages and their comments feeds
+    def is_cached(abs_path, key, cached_key):
+        """
+        If the key matches the one cached from the last run and the file
+        is still there, note it as written and return True.
+        """
+        if key == cached_key and path.exists(abs_path):
+            record_written_file(abs_path)
+            return True
+        return False
+
+
+    def write_unless_cached(abs_path, key, cached_key, generate):
+        """
+        If the output is cached from the last run, leave it be;
+        otherwise, call generate for the content and write that.
+        """
+        if not is_cached(abs_path, key, cached_key):
+            write_and_record(abs_path, generate())
+
+
+    def write_listing_unless_cached(abs_path, posts_listed, page_args, generate):
+        """
+        Like ``write_unless_cached``, for listing pages keyed by
+        ``listing_cache_key``.
+        """
+        cache_id = path.relpath(abs_path, gen_root)
+        key = new_listings_cache[cache_id] = listing_cache_key(posts_listed, *page_args)
+        write_unless_cached(abs_path, key, old_listings_cache.get(cache_id), generate)
+
+
+    # Create all missing output directories up front, rather than
+    # checking every path component again for each page written.
+    # (Attachment directories are still created as they're needed.)
+    output_dirs = {
+        path.join(gen_root, *post['meta']['_internal']['path_parts'])
+        for post in posts_desc
+    }
+    output_dirs.add(path.join(gen_root, 'archive'))
+    output_dirs.update(
+        path.join(gen_root, 'tag', tag_slug)
+        for tag_slug, tagged_posts_desc in tag_slugs_to_posts_desc.items()
+        if len(tagged_posts_desc) > 1
+    )
+    for output_dir in sorted(output_dirs - existing_dirs):
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Pages and feeds whose inputs haven't changed since the last run
+    # don't need to be rendered again at all -- just kept. Only the current posts
+    # are carried over into the new cache.
+    old_posts_cache = old_build_cache.get('posts', {})
+    new_posts_cache = {}
+    old_listings_cache = old_build_cache.get('listings', {})
+    new_listings_cache = {}
+
+    # Only the tag counts are needed for post pages, which is much
+    # cheaper to ship to worker processes than the tagged posts.
+    tag_slug_counts = {
+        tag_slug: len(tagged_posts_desc)
+        for tag_slug, tagged_posts_desc in tag_slugs_to_posts_desc.items()
+    }
+
+    # Generate post pages and their comments feeds. Work out which ones
+    # need rendering first, render those across all cores, then write
+    # them out from here.
+    #
+    # List of (post, page path or None, feed path or None)
+    post_render_jobs = []
+    # Attachments to hardlink, as (source path, source inode, dest path)
+    attachment_links = []
     for post in posts_desc:
         post_gen_dir = path.join(gen_root, *post['meta']['_internal']['path_parts'])
-        os.makedirs(post_gen_dir, exist_ok=True)
-        write_and_record(
-            path.join(post_gen_dir, 'index.html'),
-            generate_post_page(post, tag_slugs_to_posts_desc)
-        )
-        write_and_record(
-            path.join(post_gen_dir, 'comments.atom'),
-            generate_post_comments_atom_feed(post)
-        )
+        post_cache_id = '/'.join(post['meta']['_internal']['path_parts'])
+        old_post_cache = old_posts_cache.get(post_cache_id, {})
+        new_post_cache = new_posts_cache[post_cache_id] = {
+            'page': post_page_cache_key(post, tag_slug_counts),
+            # The comments feed depends on nothing outside the post.
+            'comments_feed': post['meta']['_internal']['src_hash'],
+        }
+        page_path = path.join(post_gen_dir, 'index.html')
+        if is_cached(page_path, new_post_cache['page'], old_post_cache.get('page')):
+            page_path = None
+        feed_path = path.join(post_gen_dir, 'comments.atom')
+        if is_cached(feed_path, new_post_cache['comments_feed'], old_post_cache.get('comments_feed')):
+            feed_path = None
+        if page_path or feed_path:
+            post_render_jobs.append((post, page_path, feed_path))
         # Hardlink any attachments (source dir is not published to web)
         attach_src_dir = path.join(post['meta']['_internal']['source_dir'], 'attach')
         if path.exists(attach_src_dir):
             attach_dest_dir = path.join(post_gen_dir, 'attach')
-            os.makedirs(attach_dest_dir, exist_ok=True)
             attachments_written = False
-            for filename in os.listdir(attach_src_dir):
-                attach_src = path.join(attach_src_dir, filename)
-                if path.isdir(attach_src):
-                    print(f"Warning: Skipping attachment dir {attach_src}")
-                    continue
-                if path.islink(attach_src):
-                    print(f"Warning: Skipping attachment symlink {attach_src}")
-                    continue
-                attach_dest = path.join(attach_dest_dir, filename)
-                # Remove dest first, but only if it isn't the same hardlink
-                if path.exists(attach_dest):
-                    if os.stat(attach_src).st_ino != os.stat(attach_dest).st_ino:
-                        os.remove(attach_dest)
-                # Make the hardlink (if not present)
-                if not path.exists(attach_dest):
-                    os.link(attach_src, attach_dest)
-                # Either way, mark it as wanted in the output
-                record_written_file(attach_dest)
-                attachments_written = True
+            with os.scandir(attach_src_dir) as attach_srcs:
+                for attach_src in attach_srcs:
+                    if attach_src.is_symlink():
+                        print(f"Warning: Skipping attachment symlink {attach_src.path}")
+                        continue
+                    if attach_src.is_dir():
+                        print(f"Warning: Skipping attachment dir {attach_src.path}")
+                        continue
+                    attach_dest = path.join(attach_dest_dir, attach_src.name)
+                    # The inode from the listing (d_ino) can differ from what
+                    # stat reports (e.g. on overlayfs), and it's compared
+                    # against a stat of the destination.
+                    src_ino = attach_src.stat(follow_symlinks=False).st_ino
+                    attachment_links.append((attach_src.path, src_ino, attach_dest))
+                    # Mark it as wanted in the output
+                    record_written_file(attach_dest)
+                    attachments_written = True
+            # Only create the output dir if something will be in it;
+            # otherwise it would be deleted again as stale next run.
             if attachments_written:
+                os.makedirs(attach_dest_dir, exist_ok=True)
                 write_and_record(
                     path.join(attach_dest_dir, 'warning-hardlinks'),
                     "Warning: These are hardlinked files and cannot be independently edited on the published side."
                 )
 
+    # Linking is all syscalls, so threads can overlap the latency.
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(hardlink_attachment, *zip(*attachment_links)))
+
+    rendered = map_across_cores(
+        render_post_outputs,
+        [post for post, _, _ in post_render_jobs],
+        itertools.repeat(tag_slug_counts),
+        [page_path is not None for _, page_path, _ in post_render_jobs],
+        [feed_path is not None for _, _, feed_path in post_render_jobs],
+    )
+    for (_, page_path, feed_path), (page, feed) in zip(post_render_jobs, rendered):
+        if page_path:
+            write_and_record(page_path, page)
+        if feed_path:
+            write_and_record(feed_path, feed)
+
     # Generate a drafts index page, if there are any
     draft_posts = [p for p in posts_desc if p['meta'].get('draft')]
     if draft_posts:
         drafts_dir = path.join(gen_root, 'draft')
-        os.makedirs(drafts_dir, exist_ok=True)
-        write_and_record(
-            path.join(drafts_dir, 'index.html'),
-            generate_quicklinks_page(
+        write_listing_unless_cached(
+            path.join(drafts_dir, 'index.html'), draft_posts, [],
+            lambda: generate_quicklinks_page(
                 draft_posts,
                 page_title='Drafts',
                 safe_html_page_desc='Drafts, only visible locally',
@@ -1069,33 +1683,36 @@ def cmd_generate():
             )
         )
 
-    # Trim down the posts to just public ones now -- and calculate any
-    # information we need before that filtering.
-    posts_count = len(posts_desc)
-    posts_desc = [post for post in posts_desc if is_public(post)]
+    # Everything from here on (listings, feed) only includes public posts.
+    posts_public_desc = [post for post in posts_desc if is_public(post)]
 
     # Chunk out archive pages in a way that produces the smallest
     # movement of chunk boundaries when a new post is created.
-    archive_chunks = chunk_stable(posts_desc, chunk_size=5, min_size=3)
-    # Index the list, *ascending with time* -- oldest (last-in-list) archive will be 1.html.
-    # List of pairs of (index, list of pages)
-    archive_chunks = list(reversed(list(enumerate(reversed(archive_chunks), start=1))))
+    archive_chunks = chunk_stable(posts_public_desc, chunk_size=5, min_size=3)
 
     # Replace the indexes with IDs that can't be readily guessed.
     #
     # If someone wants to trawl through my really old shit from high
     # school, they're gonna have to click the "older posts" button
     # like 30 times.
+    archive_id_secret = ssg_config['archive_id_secret'].encode()
+
     def archive_id_from_index(index):
         # Unpredictable ID that won't change over time or with editing.
-        data = f"{index}{ssg_config['archive_id_secret']}".encode()
-        tag = hashlib.shake_128(data).hexdigest(4).lower()
+        # (Any change to this derivation changes every archive URL.)
+        data = str(index).encode() + archive_id_secret
+        tag = hashlib.shake_128(data).hexdigest(4)
         # But still lead with the actual index, since it's not
         # *secret*, and it's useful to know.
         return f"{index}_{tag}"
 
-    # Now it's a list of pairs of (ID, list of pages)
-    archive_chunks = list(map(lambda chunk: (archive_id_from_index(chunk[0]), chunk[1]), archive_chunks))
+    # Index the list, *ascending with time* -- oldest (last-in-list)
+    # archive will be 1.html. Now it's a list of pairs of (ID, list of pages)
+    archive_count = len(archive_chunks)
+    archive_chunks = [
+        (archive_id_from_index(archive_count - i), chunk)
+        for i, chunk in enumerate(archive_chunks)
+    ]
 
     # Break out the first chunk as the index page.
     if len(archive_chunks) > 0:
@@ -1109,9 +1726,9 @@ def cmd_generate():
         most_recent_archive = f"{base_path}/archive/{archive_chunks[0][0]}.html"
     else:
         most_recent_archive = None
-    write_and_record(
-        path.join(gen_root, 'index.html'),
-        generate_multipost_page(
+    write_listing_unless_cached(
+        path.join(gen_root, 'index.html'), index_listing, [most_recent_archive],
+        lambda: generate_multipost_page(
             index_listing, page_title="Recent posts",
             safe_html_intro="""
 <div id="intro">
@@ -1150,7 +1767,7 @@ def cmd_generate():
             safe_html_page_desc=(
                 f"My most recent posts. If you'd like to know "
                 "when new posts come out, I invite you to "
-                f'<a href="{html.escape(main_feed_path)}">subscribe to the feed</a>.'
+                f'<a href="{safe_html_main_feed_path}">subscribe to the feed</a>.'
             ),
             content_class="recent-posts",
             older_url=most_recent_archive,
@@ -1160,13 +1777,11 @@ def cmd_generate():
 
     # Generate archive pages
     archives_dir = path.join(gen_root, 'archive')
-    os.makedirs(archives_dir, exist_ok=True)
     for archive_index, chunk in enumerate(archive_chunks):
         (chunk_id, chunk_pages) = chunk
         newest_date = chunk_pages[ 0]['meta']['date']
-        oldest_date = chunk_pages[-1]['meta']['date']
-        newest_date_str = newest_date.date().isoformat()
-        oldest_date_str = oldest_date.date().isoformat()
+        newest_date_str = chunk_pages[ 0]['meta']['_internal']['iso_day']
+        oldest_date_str = chunk_pages[-1]['meta']['_internal']['iso_day']
         if newest_date_str == oldest_date_str:
             date_range_descr = newest_date_str
         else:
@@ -1193,9 +1808,10 @@ def cmd_generate():
                 "in the deep archives that's really only of archaeological interest."
             )
 
-        write_and_record(
+        write_listing_unless_cached(
             path.join(archives_dir, f"{chunk_id}.html"),
-            generate_multipost_page(
+            chunk_pages, [h_page_desc, older_url, newer_url],
+            lambda: generate_multipost_page(
                 chunk_pages, page_title=f"Archive", safe_html_intro="",
                 safe_html_page_desc=h_page_desc,
                 content_class="archive-posts",
@@ -1204,10 +1820,12 @@ def cmd_generate():
             )
         )
 
-    # Generate main posts feed
-    write_and_record(
+    # Generate main posts feed, unless none of its entries have changed
+    posts_feed_key = posts_feed_cache_key(posts_public_desc)
+    write_unless_cached(
         path.join(gen_root, 'posts.atom'),
-        generate_posts_atom_feed(posts_desc)
+        posts_feed_key, old_build_cache.get('posts_feed'),
+        lambda: generate_posts_atom_feed(posts_public_desc)
     )
 
     # Generate tags pages
@@ -1218,9 +1836,9 @@ def cmd_generate():
         if len(tagged_posts_desc) <= 1:
             continue
         tag_dir = path.join(gen_root, 'tag', tag_slug)
-        os.makedirs(tag_dir, exist_ok=True)
-        write_and_record(path.join(tag_dir, 'index.html'),
-            generate_quicklinks_page(
+        write_listing_unless_cached(
+            path.join(tag_dir, 'index.html'), tagged_posts_desc, [tag_slug],
+            lambda: generate_quicklinks_page(
                 tagged_posts_desc, page_title=f'Tagged "{tag_slug}"',
                 safe_html_page_desc=(
                     f'All posts tagged with "{html.escape(tag_slug)}".'
@@ -1229,29 +1847,56 @@ def cmd_generate():
             )
         )
 
-    # Remove all files that weren't re-generated
-    for parent, _dirnames, filenames in os.walk(gen_root, topdown=False):
-        for filename in filenames:
-            filepath = path.join(parent, filename)
-            if filepath not in paths_written:
-                os.remove(filepath)
-                print(f"Deleting stale {filepath}")
-    # Remove any remaining empty directories
-    for parent, dirnames, filenames in os.walk(gen_root):
-        if not dirnames and not filenames:
-            os.removedirs(parent)
-            print(f"Deleting empty {parent}")
+    # Remove all files that weren't re-generated (existing_paths already
+    # has everything that was on disk beforehand.)
+    for filepath in sorted(existing_paths - paths_written):
+        os.remove(filepath)
+        print(f"Deleting stale {filepath}")
+    # Then remove any directories that no longer have anything
+    # generated beneath them, deepest first.
+    kept_dirs = {gen_root}
+    for filepath in paths_written:
+        parent = path.dirname(filepath)
+        while parent not in kept_dirs:
+            kept_dirs.add(parent)
+            parent = path.dirname(parent)
+    for parent in sorted(existing_dirs - kept_dirs, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(parent)
+        except OSError as e:
+            # Something turned up in it that the sweep above didn't
+            # know about; leave it rather than failing the whole run.
+            if e.errno != errno.ENOTEMPTY:
+                raise
+            print(f"Warning: Not deleting non-empty stale directory {parent}")
+            continue
+        print(f"Deleting empty {parent}")
+
+    save_build_cache({
+        'input_fingerprint': fingerprint,
+        'posts': new_posts_cache,
+        'posts_feed': posts_feed_key,
+        'listings': new_listings_cache,
+    })
 
-    log(f"INFO: Processed {posts_count} posts")
+    log(f"INFO: Processed {len(posts_desc)} posts")
 
 
 #### Command: normalize
 
 
 def normalize_file(file_path):
-    """Just split a file and write it back again."""
-    (meta, content_raw) = split_front_matter(file_path)
-    compose_with_front_matter(meta, content_raw, file_path)
+    """Just split a file and write it back again, if that changes it."""
+    # Read without newline translation, so that the comparison below
+    # sees e.g. CRLF line endings (which get normalized away.)
+    with open(file_path, 'r', newline='') as f:
+        file_raw = f.read()
+    combo_raw = file_raw.replace('\r\n', '\n').replace('\r', '\n')
+    (meta, content_raw) = split_front_matter_text(combo_raw, file_path)
+    output = compose_front_matter(meta, content_raw)
+    if output != file_raw:
+        with open(file_path, 'w') as f:
+            f.write(output)
 
 
 @cli.command(name='normalize')
@@ -1263,10 +1908,8 @@ def cmd_normalize():
     matter. This allows for automated changes to posts without causing
     spurious diffs.
     """
-    for post_dir in list_post_dirs():
-        normalize_file(path.join(post_dir, 'index.md'))
-        for comment_path in list_comments_for_post(post_dir):
-            normalize_file(comment_path)
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(normalize_file, list_source_files(), chunksize=16))
 
 
 #### Command: update
@@ -1357,6 +2000,27 @@ def cmd_public(post_path):
 #### Command: fix-encoding
 
 
+def fix_encoding_file(file_path):
+    """Fix encoding issues in one post or comment file."""
+    import ftfy
+
+    def fixer(s):
+        # Mojibake always involves non-ASCII characters, so most
+        # strings can skip ftfy's analysis entirely.
+        if s.isascii():
+            return s
+        return ftfy.fix_encoding(s)
+
+    (meta, content_raw) = split_front_matter(file_path)
+
+    update_value(meta, 'title', fixer)
+    update_value(meta, 'author', fixer)
+    update_value(meta, 'tags', lambda tags: list(fixer(t) for t in tags))
+    content_raw = fixer(content_raw)
+
+    compose_with_front_matter(meta, content_raw, file_path)
+
+
 @cli.command(name='fix-encoding')
 def cmd_fix_encoding():
     """
@@ -1364,24 +2028,9 @@ def cmd_fix_encoding():
 
     This should generally only be needed once, after an initial import.
     """
-    def fixer(s):
-        return ftfy.fix_encoding(s)
-
-    def fix_one_file(file_path):
-        (meta, content_raw) = split_front_matter(file_path)
-
-        update_value(meta, 'title', fixer)
-        update_value(meta, 'author', fixer)
-        update_value(meta, 'tags', lambda tags: list(fixer(t) for t in tags))
-        content_raw = fixer(content_raw)
-
-        compose_with_front_matter(meta, content_raw, file_path)
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(fix_encoding_file, list_source_files(), chunksize=16))
 
-    for post_dir in list_post_dirs():
-        fix_one_file(path.join(post_dir, 'index.md'))
-        for comment_path in list_comments_for_post(post_dir):
-            fix_one_file(comment_path)
-    
 
 #### Command: migrate-blog-attachments
 
@@ -1402,11 +2051,12 @@ def cmd_migrate_blog_attachments():
     for pd in list_post_dirs():
         with open(path.join(pd, 'index.md'), 'r') as f:
             post_raw = f.read()
-        matches = ref.findall(post_raw)
+        matches = list(ref.finditer(post_raw))
         if not matches:
             continue
         urls = set()
-        for au in matches:
+        for m in matches:
+            au = m.group(1)
             af = uparse.unquote(au)
             if path.exists(path.join(old_attach_root, af)):
                 urls.add(au)
@@ -1418,10 +2068,10 @@ def cmd_migrate_blog_attachments():
                     missing.add(au)
                     print(f"WARNING: Post {path.basename(pd)} references nonexistent file {af}")
         else:
-            posts[pd] = {'raw': post_raw, 'urls': urls}
+            posts[pd] = {'raw': post_raw, 'urls': urls, 'matches': matches}
 
-    all_urls = [u for (_, v) in posts.items() for u in v['urls']]
-    cross_urls = {u for u in all_urls if all_urls.count(u) != 1}
+    url_counts = collections.Counter(u for v in posts.values() for u in v['urls'])
+    cross_urls = {u for u, count in url_counts.items() if count != 1}
     if cross_urls:
         print(f"ERROR: Some urls are shared across posts: {cross_urls}")
         return
@@ -1440,7 +2090,15 @@ def cmd_migrate_blog_attachments():
         print(f"Moving {len(urls)} files into {path.basename(pd)}")
         if not len(urls):
             continue
-        raw = ref.sub(update_path, raw)
+        # Replace using the matches already found, rather than scanning again
+        parts = []
+        pos = 0
+        for m in pv['matches']:
+            parts.append(raw[pos:m.start()])
+            parts.append(update_path(m))
+            pos = m.end()
+        parts.append(raw[pos:])
+        raw = ''.join(parts)
         att_dest = path.join(pd, 'attach')
         os.makedirs(att_dest, exist_ok=True)
         for au in urls:
@@ -1,5 +1,100 @@
+from lxml import etree as ET
+
 import ssg
 
+# Reference Atom feed generation, which the directly-emitted feeds in ssg
+# are checked against.
+
+# Namespace of the built-in xml: prefix, and the attributes used from it
+xml_ns = "http://www.w3.org/XML/1998/namespace"
+xml_lang = f'{{{xml_ns}}}lang'
+xml_base = f'{{{xml_ns}}}base'
+# Qualified (Clark notation) names of the Atom elements used in feeds
+atom_tags = {
+    name: f'{{{ssg.atom_ns}}}{name}'
+    for name in [
+        'feed', 'title', 'subtitle', 'link', 'id', 'entry', 'author',
+        'name', 'uri', 'updated', 'published', 'category', 'content',
+    ]
+}
+
+def generate_posts_atom_feed_etree(posts_desc):
+    """
+    Given posts in descending chronological order, generate the main Atom
+    feed (as UTF-8 bytes) by way of an lxml element tree. Slower, but
+    obviously well-formed; ``ssg.generate_posts_atom_feed`` is checked
+    against it.
+    """
+    # Generate full public-site URL here -- it's a global identifier
+    # in some places in the feed, and needs to be absolute in others.
+    blog_url = ssg.base_authority + ssg.base_path
+    feed_full_url = ssg.base_authority + ssg.main_feed_path
+
+    root = ET.Element(atom_tags['feed'], {
+        xml_lang: 'en-US',
+        xml_base: blog_url + '/'
+    }, nsmap={None: ssg.atom_ns})
+    ET.SubElement(root, atom_tags['title']).text = ssg.site_title
+    ET.SubElement(root, atom_tags['subtitle']).text = ssg.site_subtitle
+    ET.SubElement(root, atom_tags['link'], rel='alternate', type='text/html', href=blog_url)
+    ET.SubElement(root, atom_tags['id']).text = feed_full_url
+    ET.SubElement(root, atom_tags['link'], rel='self', type="application/atom+xml", href=feed_full_url)
+    for post in posts_desc[:ssg.main_feed_max_entries]:
+        meta = post['meta']
+        # Absolute URL, not absolute path
+        permalink = meta['_internal']['full_url']
+        entry = ET.SubElement(root, atom_tags['entry'])
+        author = ET.SubElement(entry, atom_tags['author'])
+        ET.SubElement(author, atom_tags['name']).text = "Tim McCormack"
+        ET.SubElement(author, atom_tags['uri']).text = "https://www.brainonfire.net/"
+        ET.SubElement(entry, atom_tags['title']).text = meta['title']
+        ET.SubElement(entry, atom_tags['link'], rel='alternate', type='text/html', href=permalink)
+        ET.SubElement(entry, atom_tags['id']).text = permalink
+        ET.SubElement(entry, atom_tags['updated']).text = meta['_internal']['iso_updated']
+        ET.SubElement(entry, atom_tags['published']).text = meta['_internal']['iso_date']
+        for tag in meta.get('tags', []):
+            ET.SubElement(entry, atom_tags['category'], term=tag)
+        ET.SubElement(entry, atom_tags['content'], {xml_base: permalink}, type='html').text = ssg.generate_post_content_html(post)
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+def generate_post_comments_atom_feed_etree(post):
+    """
+    Given a post, generate an Atom feed of its comments (as UTF-8 bytes),
+    by way of an lxml element tree. Slower, but obviously well-formed;
+    ``ssg.generate_post_comments_atom_feed`` is checked against it.
+    """
+    # Generate full public-site URL here -- it's a global identifier
+    # in some places in the feed, and needs to be absolute in others.
+    post_full_url = post['meta']['_internal']['full_url']
+    feed_full_url = ssg.base_authority + post['meta']['_internal']['comments_feed_path']
+
+    root = ET.Element(atom_tags['feed'], {
+        xml_lang: 'en-US',
+        xml_base: post_full_url
+    }, nsmap={None: ssg.atom_ns})
+    ET.SubElement(root, atom_tags['title']).text = f"Comments on “{post['meta']['title']}”"
+    ET.SubElement(root, atom_tags['link'], rel='alternate', type='text/html', href=f"{post_full_url}#comments")
+    ET.SubElement(root, atom_tags['id']).text = feed_full_url
+    ET.SubElement(root, atom_tags['link'], rel='self', type="application/atom+xml", href=feed_full_url)
+    for comment in reversed(post['comments']):
+        meta = comment['meta']
+        # Absolute URL, not absolute path
+        permalink = f"{post_full_url}#comment-{meta['id']}"
+        entry = ET.SubElement(root, atom_tags['entry'])
+        ET.SubElement(entry, atom_tags['title']).text = f"By: {meta['author']}"
+        ET.SubElement(entry, atom_tags['link'], rel='alternate', type='text/html', href=permalink)
+        author = ET.SubElement(entry, atom_tags['author'])
+        ET.SubElement(author, atom_tags['name']).text = meta['author']
+        author_url = meta['authorUrl']
+        if author_url and ssg.re_comment_safe_author_url.match(author_url):
+            ET.SubElement(author, atom_tags['uri']).text = author_url
+        ET.SubElement(entry, atom_tags['id']).text = permalink
+        ET.SubElement(entry, atom_tags['updated']).text = meta['_internal']['iso_updated']
+        ET.SubElement(entry, atom_tags['published']).text = meta['_internal']['iso_date']
+        safe_html_comment_content = ssg.generate_comment_content_html(comment, post)
+        ET.SubElement(entry, atom_tags['content'], {xml_base: post_full_url}, type='html').text = safe_html_comment_content
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
 def test_chunking():
     assert ssg.chunk_stable(list(range(0)), 5, 3) == []
     assert ssg.chunk_stable(list(range(1)), 5, 3) == [[0]]
@@ -11,3 +106,75 @@ def test_chunking():
     assert ssg.chunk_stable(list(range(8)), 5, 3) == [[0,1,2], [3,4,5,6,7]]
     assert ssg.chunk_stable(list(range(11)), 5, 3) == [[0, 1,2,3,4,5], [6,7,8,9,10]]
     assert ssg.chunk_stable(list(range(13)), 5, 3) == [[0,1,2], [3,4,5,6,7], [8,9,10,11,12]]
+
+def test_ordinal_suffix():
+    assert [ssg.ordinal_suffix(i) for i in range(1, 5)] == ["st", "nd", "rd", "th"]
+    assert [ssg.ordinal_suffix(i) for i in range(11, 14)] == ["th", "th", "th"]
+    assert [ssg.ordinal_suffix(i) for i in (21, 22, 23, 31)] == ["st", "nd", "rd", "st"]
+    assert [ssg.ordinal_suffix(i) for i in (0, 100, 101, 111, 112, -1, -12)] == ["th", "th", "st", "th", "th", "st", "th"]
+
+def test_split_front_matter(tmp_path):
+    post_file = tmp_path / "index.md"
+    post_file.write_text('{\n    "title": "x---y"\n}\n---\nSome\n---\ncontent\n')
+    assert ssg.split_front_matter(post_file) == ({"title": "x---y"}, "Some\n---\ncontent\n")
+    post_file.write_text('{}\n--- \nno separator\n')
+    assert ssg.split_front_matter(post_file) is None
+
+def test_comments_feed_matches_etree():
+    def comment(cid, author, author_url, raw):
+        iso = '2020-01-02T03:04:05-05:00'
+        return {
+            'meta': {'id': cid, 'author': author, 'authorUrl': author_url,
+                     '_internal': {'iso_date': iso, 'iso_updated': iso}},
+            'raw': raw,
+        }
+    post = {
+        'meta': {
+            'url': '/2020/01/02/a-"quoted"-post/', 'title': 'Tabs\tand <tags> & "quotes"',
+            '_internal': {
+                'full_url': 'https://example.com/blog/2020/01/02/a-"quoted"-post/',
+                'comments_feed_path': '/blog/2020/01/02/a-"quoted"-post/comments.atom',
+            },
+        },
+        'comments': [
+            comment('1', 'Alice & <Bob>', 'https://example.com/?a=1&b="2"', 'Line one\r\n\r\nLine <b>two</b> & more'),
+            comment('2', 'Carol', 'javascript:alert(1)', 'Hi {{h_attach_url}}/x.png'),
+        ],
+    }
+    assert ssg.generate_post_comments_atom_feed(post) == generate_post_comments_atom_feed_etree(post)
+    post['comments'] = []
+    assert ssg.generate_post_comments_atom_feed(post) == generate_post_comments_atom_feed_etree(post)
+
+def test_posts_feed_matches_etree():
+    def post(n, tags):
+        iso = f'2020-01-0{n}T03:04:05-05:00'
+        return {
+            'meta': {
+                'title': f'Post {n} <b> & "quoted"', 'tags': tags,
+                '_internal': {
+                    'full_url': f'https://example.com/blog/2020/01/0{n}/post-&-{n}/',
+                    'iso_date': iso, 'iso_updated': iso,
+                },
+            },
+            'rendered': {'full': f'<p>Body {n} &amp; more</p>\r\n<pre>\tcode</pre>', 'excerpt': None},
+        }
+    posts_desc = [post(3, ['a & b', 'Quote"d']), post(2, []), post(1, ['x'])]
+    assert ssg.generate_posts_atom_feed(posts_desc) == generate_posts_atom_feed_etree(posts_desc)
+    assert ssg.generate_posts_atom_feed([]) == generate_posts_atom_feed_etree([])
+
+def test_listing_cache_key_follows_draft_rename(tmp_path):
+    def listing_key(dir_name):
+        post_dir = tmp_path / dir_name
+        post_dir.mkdir()
+        (post_dir / "index.md").write_text(
+            '{"draft": true, "title": "T", "url": "", "date": "2020-01-02T03:04:05-05:00"}\n---\nBody\n'
+        )
+        return ssg.listing_cache_key([ssg.load_post(str(post_dir))])
+    assert listing_key("p005") != listing_key("p006")
+
+def test_compose_with_front_matter_rewrites_crlf(tmp_path):
+    post_file = tmp_path / "index.md"
+    post_file.write_bytes(b'{\r\n    "title": "T"\r\n}\r\n---\r\nBody\r\n')
+    (meta, content_raw) = ssg.split_front_matter(post_file)
+    ssg.compose_with_front_matter(meta, content_raw, post_file)
+    assert post_file.read_bytes() == b'{\n    "title": "T"\n}\n---\nBody\n'